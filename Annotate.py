@@ -0,0 +1,145 @@
+import sys
+import time
+
+import Engine
+import GameLog
+import Player
+
+class Annotation():
+    """
+    ANNOTATION CLASS:
+        pod class, the analysis of one ply of a game
+
+        contains the ply number, counting from 0 (self.ply)
+        contains the move that was played (self.played)
+        contains the engine's best move in the position (self.best)
+        contains the engine's score of the position, from the mover's point of view (self.score)
+        contains how much the played move changed that score (self.swing),
+            around 0 for good moves, negative for mistakes
+    """
+
+    def __init__(self, ply, played, best, score, swing):
+        self.ply = ply
+        self.played = played
+        self.best = best
+        self.score = score
+        self.swing = swing
+
+class Annotator():
+    """
+    ANNOTATOR CLASS:
+        analyses every position of a game with one AIPlayer
+
+        the same AIPlayer (and so the same transposition table, killer moves and evaluation
+        caches) is used for every ply, so work done on one position carries over to its
+        neighbours. walking backwards (the default) searches the later positions first, which
+        are the ones the earlier positions' searches run into.
+        with reuse=False, every ply gets a fresh AIPlayer (for comparison).
+    """
+
+    def __init__(self, depth=2, backwards=True, reuse=True):
+        self.depth = depth
+        self.backwards = backwards
+        self.reuse = reuse
+        self.ai = self.__new_ai()
+        self.nodes = 0      # Nodes searched by the last annotate call
+
+    def annotate(self, moves):
+        """
+        ANNOTATE method:
+            takes the moves of a game from the starting position (a list of "Move" objects,
+            ex. past_moves, or (start, end) squares, ex. GameLog.get_moves),
+            returns a list with one Annotation per move.
+        REQUIRES: self.depth >= 1
+        """
+        self.nodes = 0
+        squares = [(move.start, move.end) if isinstance(move, Engine.Move) else move for move in moves]
+
+        # Play the game out to the end, then score positions in the chosen order
+        gs = Engine.Gamestate()
+        for start, end in squares:
+            gs.make_move(Engine.Move(start, end, gs.board))
+            gs.switch_turn()
+        # scores[ply]/best_moves[ply]: full depth search of the position before move "ply"
+        # replies[ply]: search of the position after move "ply", one ply shallower, so that
+        # it scores the played move the same way the search before it scored its moves
+        scores = [0] * len(squares)
+        best_moves = [None] * len(squares)
+        replies = [0] * len(squares)
+        if self.backwards:
+            for ply in range(len(squares), -1, -1):
+                if ply != len(squares):
+                    scores[ply], best_moves[ply] = self.__search(gs, self.depth)
+                if ply != 0:
+                    replies[ply - 1], _ = self.__search(gs, self.depth - 1)
+                    gs.switch_turn()
+                    gs.undo_move()
+        else:
+            while len(gs.past_moves) != 0:
+                gs.switch_turn()
+                gs.undo_move()
+            for ply in range(len(squares)):
+                scores[ply], best_moves[ply] = self.__search(gs, self.depth)
+                gs.make_move(Engine.Move(squares[ply][0], squares[ply][1], gs.board))
+                gs.switch_turn()
+                replies[ply], _ = self.__search(gs, self.depth - 1)
+
+        annotations = []
+        for ply in range(len(squares)):
+            swing = -replies[ply] - scores[ply]
+            annotations.append(Annotation(ply, squares[ply], best_moves[ply], scores[ply], swing))
+        return annotations
+
+    # Helper methods
+    def __search(self, gs, depth):
+        """
+        HELPER METHOD:
+            returns (score, best move) for gs from an AIPlayer search at DEPTH = depth,
+            from the current player's point of view.
+            game-over positions are scored without searching (best move is None).
+        """
+        if gs.is_checkmate():
+            return -Player.CHECKMATE_SCORE, None
+        if gs.is_stalemate():
+            return 0, None
+        if not self.reuse:
+            self.ai = self.__new_ai()
+        self.ai.color = gs.current_player
+        self.ai.DEPTH = depth
+        best = self.ai.get_move(gs)
+        self.nodes += self.ai.nodes
+        return self.ai.score, best
+    def __new_ai(self):
+        return Player.AIPlayer('w')
+
+def write_annotations(out, annotations):
+    """
+    HELPER METHOD:
+        writes one line per annotation to "out": move number, played move, best move,
+        score before the move (White's point of view) and swing.
+    """
+    gs = Engine.Gamestate()
+    out.write("%-8s %-8s %-8s %8s %8s\n" % ("ply", "played", "best", "score", "swing"))
+    for annotation in annotations:
+        move = Engine.Move(annotation.played[0], annotation.played[1], gs.board)
+        best = GameLog.to_san(gs, annotation.best) if annotation.best is not None else "-"
+        played = GameLog.to_san(gs, move)
+        score = annotation.score if gs.current_player == 'w' else -annotation.score
+        number = "%d.%s" % (annotation.ply // 2 + 1, "" if gs.current_player == 'w' else "..")
+        out.write("%-8s %-8s %-8s %8d %8d\n" % (number, played, best, score, annotation.swing))
+        gs.make_move(move)
+        gs.switch_turn()
+
+if __name__ == "__main__":
+    # Usage: python3 Annotate.py <log path> <game> [depth] [--forwards] [--cold]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    log = GameLog.GameLog(args[0])
+    moves = log.get_moves(int(args[1]))
+    log.close()
+
+    annotator = Annotator(int(args[2]) if len(args) > 2 else 2, "--forwards" not in sys.argv, "--cold" not in sys.argv)
+    start = time.perf_counter()
+    annotations = annotator.annotate(moves)
+    elapsed = time.perf_counter() - start
+    write_annotations(sys.stdout, annotations)
+    print("%d nodes in %.2fs" % (annotator.nodes, elapsed))
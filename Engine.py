@@ -1,3 +1,5 @@
+import random
+
 class Gamestate():
     """
     GAMESTATE CLASS:
@@ -5,6 +7,7 @@ class Gamestate():
             ex) white pawn would be represented as "wp" on board,
         contains current player (self.current_player) as a char ('b'/'w')
         contains any past moves that have been made on the board as a list of "Move" objects
+        contains zobrist hashes of the position (self.hash) and of the pawns alone (self.pawn_hash)
     """
 
     def __init__(self):
@@ -22,6 +25,7 @@ class Gamestate():
 
         self.whiteking_loc = (7, 4)
         self.blackking_loc = (0, 4)
+        self.__compute_hashes()
     
     # Engine actions
     def make_move(self, move):
@@ -35,6 +39,7 @@ class Gamestate():
             handles pawn promotions
         """
         if is_valid_pos(move.start) and is_valid_pos(move.end):
+            self.__hash_move(move)
             self.board[move.start[0]][move.start[1]] = "  "
             self.board[move.end[0]][move.end[1]] = move.piece1
             self.past_moves.append(move)
@@ -59,6 +64,7 @@ class Gamestate():
         """
         if len(self.past_moves) != 0:
             move = self.past_moves.pop()
+            self.__hash_move(move)
             self.board[move.start[0]][move.start[1]] = move.piece1
             self.board[move.end[0]][move.end[1]] = move.piece2
 
@@ -86,6 +92,38 @@ class Gamestate():
 
         self.whiteking_loc = (7, 4)
         self.blackking_loc = (0, 4)
+        self.__compute_hashes()
+    def load_fen(self, fen):
+        """
+        ACTION method:
+            sets up the board from a FEN string
+            only the piece placement and the side to move are used,
+            castling/en passant/move counter fields are ignored.
+
+            clears self.past_moves
+        """
+        fields = fen.split()
+        self.board = []
+        for fen_row in fields[0].split('/'):
+            row = []
+            for char in fen_row:
+                if char.isdigit():
+                    row += ["  "] * int(char)
+                elif char.isupper():
+                    row.append('w' + char.lower())
+                else:
+                    row.append('b' + char)
+            self.board.append(row)
+        self.current_player = fields[1] if len(fields) > 1 else 'w'
+        self.past_moves = []
+
+        for row in range(8):
+            for col in range(8):
+                if self.board[row][col] == "wk":
+                    self.whiteking_loc = (row, col)
+                elif self.board[row][col] == "bk":
+                    self.blackking_loc = (row, col)
+        self.__compute_hashes()
     def switch_turn(self):
         """
         ACTION method:
@@ -95,8 +133,31 @@ class Gamestate():
             self.current_player = 'b'
         else:
             self.current_player = 'w'
+        self.hash ^= ZOBRIST_SIDE
 
     # Engine logic
+    def get_fen(self):
+        """
+        LOGIC method:
+            returns the position as a FEN string (piece placement and side to move only,
+            the format load_fen reads)
+        """
+        rows = []
+        for row in self.board:
+            fen_row = ""
+            empty = 0
+            for piece in row:
+                if piece == "  ":
+                    empty += 1
+                    continue
+                if empty != 0:
+                    fen_row += str(empty)
+                    empty = 0
+                fen_row += piece[1].upper() if piece[0] == 'w' else piece[1]
+            if empty != 0:
+                fen_row += str(empty)
+            rows.append(fen_row)
+        return "/".join(rows) + " " + self.current_player
     def is_check(self):
         """
         LOGIC method:
@@ -117,7 +178,7 @@ class Gamestate():
         LOGIC method:
             returns true if the current player is in a checkmate.
         """
-        if len(self.gen_valid_moves()) == 0 and self.is_check():
+        if self.is_check() and len(self.gen_valid_moves()) == 0:
             return True
         return False
     def is_stalemate(self):
@@ -125,7 +186,7 @@ class Gamestate():
         LOGIC method:
             returns true if the current player is in a stalemate.
         """
-        if len(self.gen_valid_moves()) == 0 and not self.is_check():
+        if not self.is_check() and len(self.gen_valid_moves()) == 0:
             return True
         return False
     def gen_valid_moves(self):
@@ -149,11 +210,12 @@ class Gamestate():
                 valid_moves.append(f_move)
             self.undo_move()
         return valid_moves
-    def gen_possible_moves(self):
+    def gen_possible_moves(self, captures=True, quiets=True):
         """
         CHESS LOGIC:
             generates and returns a list of all possible moves that can be made on the board,
             given the current game state and player. Does not take into account "check."
+            with captures=False only non-captures are generated, with quiets=False only captures.
 
             returns an empty list if there are no possible moves
         REQUIRES: none
@@ -163,36 +225,69 @@ class Gamestate():
         for row in range(8):
             for col in range(8):
                 if self.board[row][col][0] == self.current_player:
-                    if self.board[row][col][1] == 'p':
-                        self.__gen_pawn_moves(move_list, (row,col))
-                    elif self.board[row][col][1] == 'r':
-                        self.__gen_rook_moves(move_list, (row,col))
-                    elif self.board[row][col][1] == 'b':
-                        self.__gen_bishop_moves(move_list, (row,col))
-                    elif self.board[row][col][1] == 'q':
-                        self.__gen_queen_moves(move_list, (row,col))
-                    elif self.board[row][col][1] == 'k':
-                        self.__gen_king_moves(move_list, (row,col))
-                    elif self.board[row][col][1] == 'n':
-                        self.__gen_knight_moves(move_list, (row,col))
+                    self.__gen_moves_from(move_list, (row,col), captures, quiets)
         return move_list
+    def gen_staged_moves(self, hash_move=None, killers=()):
+        """
+        CHESS LOGIC:
+            generator version of gen_valid_moves for searching, yields valid moves in stages:
+                1) hash_move (if it is valid here)
+                2) captures, most valuable victim first, then least valuable attacker
+                3) killers (quiet moves that caused cutoffs elsewhere, if valid here)
+                4) the remaining quiet moves, promotions first
+            a stage is only generated once the stage before it is used up (captures and
+            quiet moves are separate passes over the board, the hash move and killers only
+            generate their own piece's moves), and moves are only checked for "check" right
+            before they are yielded, so a caller that stops early skips most of the work.
+            the check test (a full generation of the opponent's moves) is still the larger
+            cost per yielded move.
+
+            the board must be back to its original state whenever the generator is resumed.
+        REQUIRES: hash_move is a 'Move' object or None, killers is a list of 'Move' objects
+        MODIFIES: none
+        """
+        # Stage 1: hash move, only needs the moves of one piece
+        if hash_move is not None and self.board[hash_move.start[0]][hash_move.start[1]][0] == self.current_player:
+            from_square = []
+            self.__gen_moves_from(from_square, hash_move.start)
+            for move in from_square:
+                if move == hash_move and self.__is_legal(move):
+                    yield move
+
+        # Stage 2: captures
+        captures = [move for move in self.gen_possible_moves(quiets=False) if move != hash_move]
+        captures.sort(key=lambda move: (-PIECE_VALUES[move.piece2[1]], PIECE_VALUES[move.piece1[1]]))
+        for move in captures:
+            if self.__is_legal(move):
+                yield move
+
+        # Stage 3: killers, like the hash move only the killer's piece is generated
+        killer_moves = []
+        for killer in killers:
+            if killer == hash_move or killer in killer_moves:
+                continue
+            if self.board[killer.start[0]][killer.start[1]][0] != self.current_player:
+                continue
+            from_square = []
+            self.__gen_moves_from(from_square, killer.start, False, True)
+            for move in from_square:
+                if move == killer:
+                    killer_moves.append(move)
+                    if self.__is_legal(move):
+                        yield move
+
+        # Stage 4: quiet moves
+        quiets = [move for move in self.gen_possible_moves(captures=False) if move != hash_move]
+        quiets.sort(key=lambda move: not (move.piece1[1] == 'p' and move.end[0] in (0, 7)))
+        for move in quiets:
+            if move not in killer_moves and self.__is_legal(move):
+                yield move
 
     # Helper methods: (gui)
     def gen_valid_pos_from(self, pos):
         possible = []
         if self.board[pos[0]][pos[1]][0] == self.current_player:
-            if self.board[pos[0]][pos[1]][1] == 'p':
-                self.__gen_pawn_moves(possible, (pos[0],pos[1]))
-            elif self.board[pos[0]][pos[1]][1] == 'r':
-                self.__gen_rook_moves(possible, (pos[0],pos[1]))
-            elif self.board[pos[0]][pos[1]][1] == 'b':
-                self.__gen_bishop_moves(possible, (pos[0],pos[1]))
-            elif self.board[pos[0]][pos[1]][1] == 'q':
-                self.__gen_queen_moves(possible, (pos[0],pos[1]))
-            elif self.board[pos[0]][pos[1]][1] == 'k':
-                self.__gen_king_moves(possible, (pos[0],pos[1]))
-            elif self.board[pos[0]][pos[1]][1] == 'n':
-                self.__gen_knight_moves(possible, (pos[0],pos[1]))
+            self.__gen_moves_from(possible, pos)
         valid = []
         for move in possible:
             self.make_move(move)
@@ -201,8 +296,77 @@ class Gamestate():
             self.undo_move()
         return valid
 
+    # Helper methods: (hashing)
+    def __compute_hashes(self):
+        """
+        HELPER METHOD:
+            computes self.hash and self.pawn_hash from scratch
+        MODIFIES: self.hash, self.pawn_hash
+        """
+        self.hash = 0 if self.current_player == 'w' else ZOBRIST_SIDE
+        self.pawn_hash = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "  ":
+                    self.hash ^= ZOBRIST[piece][row * 8 + col]
+                    if piece[1] == 'p':
+                        self.pawn_hash ^= ZOBRIST[piece][row * 8 + col]
+    def __hash_move(self, move):
+        """
+        HELPER METHOD:
+            xors "move" in/out of self.hash and self.pawn_hash.
+            the same call both applies and reverts a move.
+        MODIFIES: self.hash, self.pawn_hash
+        """
+        start = move.start[0] * 8 + move.start[1]
+        end = move.end[0] * 8 + move.end[1]
+        placed = move.piece1
+        if placed[1] == 'p' and move.end[0] in (0, 7):
+            placed = placed[0] + 'q'
+
+        self.hash ^= ZOBRIST[move.piece1][start] ^ ZOBRIST[placed][end]
+        if move.piece1[1] == 'p':
+            self.pawn_hash ^= ZOBRIST[move.piece1][start]
+        if placed[1] == 'p':
+            self.pawn_hash ^= ZOBRIST[placed][end]
+        if move.piece2 != "  ":
+            self.hash ^= ZOBRIST[move.piece2][end]
+            if move.piece2[1] == 'p':
+                self.pawn_hash ^= ZOBRIST[move.piece2][end]
+
     # Helper methods: (move generation)
-    def __gen_pawn_moves(self, possible_moves, pos):
+    def __gen_moves_from(self, possible_moves, pos, captures=True, quiets=True):
+        """
+        HELPER METHOD:
+            generates possibly valid moves for whichever piece is at pos
+            (only captures/only non-captures if "quiets"/"captures" is false)
+
+        REQUIRES: possible_moves is a list of 'Move' object, pos is a tuple (r, c)
+        MODIFIES: possible_moves
+        """
+        if self.board[pos[0]][pos[1]][1] == 'p':
+            self.__gen_pawn_moves(possible_moves, pos, captures, quiets)
+        elif self.board[pos[0]][pos[1]][1] == 'r':
+            self.__gen_rook_moves(possible_moves, pos, captures, quiets)
+        elif self.board[pos[0]][pos[1]][1] == 'b':
+            self.__gen_bishop_moves(possible_moves, pos, captures, quiets)
+        elif self.board[pos[0]][pos[1]][1] == 'q':
+            self.__gen_queen_moves(possible_moves, pos, captures, quiets)
+        elif self.board[pos[0]][pos[1]][1] == 'k':
+            self.__gen_king_moves(possible_moves, pos, captures, quiets)
+        elif self.board[pos[0]][pos[1]][1] == 'n':
+            self.__gen_knight_moves(possible_moves, pos, captures, quiets)
+    def __is_legal(self, move):
+        """
+        HELPER METHOD:
+            returns true if making "move" does not leave the current player in check.
+        """
+        self.make_move(move)
+        legal = not self.is_check()
+        self.undo_move()
+        return legal
+    def __gen_pawn_moves(self, possible_moves, pos, captures=True, quiets=True):
         """
         HELPER METHOD:
             generates possibly valid pawn moves
@@ -210,6 +374,7 @@ class Gamestate():
             takes in an empty list and a position.
             generates all possible moves from this position for a pawn.
             (could still be in check after making this move)
+            only captures and/or only non-captures are generated if "quiets"/"captures" is false.
 
         REQUIRES: possible_moves is a list of 'Move' object, pos is a tuple (r, c)
         MODIFIES: possible_moves
@@ -220,7 +385,7 @@ class Gamestate():
 
         # Moving forward
         aheadone = (pos[0] + d_r, pos[1])
-        if is_valid_pos(aheadone):
+        if quiets and is_valid_pos(aheadone):
             if self.board[aheadone[0]][aheadone[1]][0] == ' ':
                 possible_moves.append(Move(pos, aheadone, self.board))
                 aheadtwo = (pos[0] + 2 * d_r, pos[1])
@@ -229,6 +394,8 @@ class Gamestate():
                         if self.board[aheadtwo[0]][aheadtwo[1]][0] == ' ':
                             possible_moves.append(Move(pos, aheadtwo, self.board))
         # Attacking
+        if not captures:
+            return
         attack_l = (pos[0] + d_r, pos[1] - 1)
         if is_valid_pos(attack_l):
             if self.board[attack_l[0]][attack_l[1]][0] == opposite_color(self.current_player):
@@ -237,7 +404,7 @@ class Gamestate():
         if is_valid_pos(attack_r):
             if self.board[attack_r[0]][attack_r[1]][0] == opposite_color(self.current_player):
                 possible_moves.append(Move(pos, attack_r, self.board))
-    def __gen_rook_moves(self, possible_moves, pos):
+    def __gen_rook_moves(self, possible_moves, pos, captures=True, quiets=True):
         """
         HELPER METHOD:
             generates possibly valid rook moves
@@ -245,6 +412,7 @@ class Gamestate():
             takes in an empty list and a position.
             generates all possible moves from this position for a rook.
             (could still be in check after making this move)
+            only captures and/or only non-captures are generated if "quiets"/"captures" is false.
 
         REQUIRES: possible_moves is a list of 'Move' object, pos is a tuple (r, c)
         MODIFIES: possible_moves
@@ -254,13 +422,13 @@ class Gamestate():
                 pos2 = (pos[0] + dist * row, pos[1] + dist * col)
                 if is_valid_pos(pos2):
                     color = self.board[pos2[0]][pos2[1]][0]
-                    if color != self.current_player:
+                    if color != self.current_player and (captures if color != ' ' else quiets):
                         possible_moves.append(Move(pos, pos2, self.board))
                     if color != ' ':
                         break
                 else:
                     break
-    def __gen_bishop_moves(self, possible_moves, pos1):
+    def __gen_bishop_moves(self, possible_moves, pos1, captures=True, quiets=True):
         """
         HELPER METHOD:
             generates possibly valid bishop moves
@@ -268,6 +436,7 @@ class Gamestate():
             takes in an empty list and a position.
             generates all possible moves from this position for a bishop.
             (could still be in check after making this move)
+            only captures and/or only non-captures are generated if "quiets"/"captures" is false.
 
         REQUIRES: possible_moves is a list of 'Move' object, pos is a tuple (r, c)
         MODIFIES: possible_moves
@@ -277,13 +446,13 @@ class Gamestate():
                 pos2 = (pos1[0] + dist * row, pos1[1] + dist * col)
                 if is_valid_pos(pos2):
                     color = self.board[pos2[0]][pos2[1]][0]
-                    if color != self.current_player:
+                    if color != self.current_player and (captures if color != ' ' else quiets):
                         possible_moves.append(Move(pos1, pos2, self.board))
                     if color != ' ':
                         break
                 else:
                     break
-    def __gen_queen_moves(self, possible_moves, pos1):
+    def __gen_queen_moves(self, possible_moves, pos1, captures=True, quiets=True):
         """
         HELPER METHOD: 
             generates possibly valid queen moves
@@ -291,6 +460,7 @@ class Gamestate():
             takes in an empty list and a position.
             generates all possible moves from this position for a queen.
             (could still be in check after making this move)
+            only captures and/or only non-captures are generated if "quiets"/"captures" is false.
 
         REQUIRES: possible_moves is a list of 'Move' object, pos is a tuple (r, c)
         MODIFIES: possible_moves
@@ -300,13 +470,13 @@ class Gamestate():
                 pos2 = (pos1[0] + dist * row, pos1[1] + dist * col)
                 if is_valid_pos(pos2):
                     color = self.board[pos2[0]][pos2[1]][0]
-                    if color != self.current_player:
+                    if color != self.current_player and (captures if color != ' ' else quiets):
                         possible_moves.append(Move(pos1, pos2, self.board))
                     if color != ' ':
                         break
                 else:
                     break
-    def __gen_king_moves(self, possible_moves, pos1):
+    def __gen_king_moves(self, possible_moves, pos1, captures=True, quiets=True):
         """
         HELPER METHOD:
             generates possibly valid king moves
@@ -314,6 +484,7 @@ class Gamestate():
             takes in an empty list and a position.
             generates all possible moves from this position for a king.
             (could still be in check after making this move)
+            only captures and/or only non-captures are generated if "quiets"/"captures" is false.
 
         REQUIRES: possible_moves is a list of 'Move' object, pos is a tuple (r, c)
         MODIFIES: possible_moves
@@ -322,9 +493,9 @@ class Gamestate():
             pos2 = (pos1[0] + row, pos1[1] + col)
             if is_valid_pos(pos2):
                 color = self.board[pos2[0]][pos2[1]][0]
-                if color != self.current_player:
+                if color != self.current_player and (captures if color != ' ' else quiets):
                     possible_moves.append(Move(pos1, pos2, self.board))
-    def __gen_knight_moves(self, possible_moves, pos1):
+    def __gen_knight_moves(self, possible_moves, pos1, captures=True, quiets=True):
         """
         HELPER METHOD:
             generates possibly valid knight moves
@@ -332,6 +503,7 @@ class Gamestate():
             takes in an empty list and a position.
             generates all possible moves from this position for a knight.
             (could still be in check after making this move)
+            only captures and/or only non-captures are generated if "quiets"/"captures" is false.
 
         REQUIRES: possible_moves is a list of 'Move' object, pos is a tuple (r, c)
         MODIFIES: possible_moves
@@ -340,7 +512,7 @@ class Gamestate():
             pos2 = (pos1[0] + row, pos1[1] + col)
             if is_valid_pos(pos2):
                 color = self.board[pos2[0]][pos2[1]][0]
-                if color != self.current_player:
+                if color != self.current_player and (captures if color != ' ' else quiets):
                     possible_moves.append(Move(pos1, pos2, self.board))
 
 class Move():
@@ -366,6 +538,15 @@ class Move():
             return False
         return (self.move_id == other.move_id)
 
+# Zobrist keys, one random 64 bit number per (piece, square), and one for black to move
+ZOBRIST_RNG = random.Random(2021)
+ZOBRIST = {piece: [ZOBRIST_RNG.getrandbits(64) for _ in range(64)]
+           for piece in ["wp","wn","wb","wr","wq","wk","bp","bn","bb","br","bq","bk"]}
+ZOBRIST_SIDE = ZOBRIST_RNG.getrandbits(64)
+
+# Piece values, used for ordering captures
+PIECE_VALUES = {'p': 100, 'n': 320, 'b': 330, 'r': 500, 'q': 900, 'k': 100000}
+
 def opposite_color(color):
     """
     HELPER METHOD:
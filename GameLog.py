@@ -0,0 +1,276 @@
+import mmap
+import os
+import struct
+import sys
+import time
+
+import Engine
+
+try:
+    import fcntl
+except ImportError:     # Windows: no file locks, a log must only have one writer at a time
+    fcntl = None
+
+# File layout:
+#   <path>.moves  header, then one MOVE_RECORD per ply of every game, back to back
+#   <path>.index  header, then one INDEX_ENTRY per game
+# Games are only ever appended. The moves of a game are written before its index
+# entry, so a game only exists once its index entry is complete. Appends hold an
+# exclusive lock on the index file, so several processes can share one log.
+MOVES_MAGIC = b"PYCHMOV1"
+INDEX_MAGIC = b"PYCHIDX1"
+HEADER_SIZE = 8
+
+MOVE_RECORD = struct.Struct("<H")       # start square | end square << 6, squares are row * 8 + col
+INDEX_ENTRY = struct.Struct("<QHBxI")   # first move record, ply count, result, (pad), unix time
+
+RESULTS = ["*", "1-0", "0-1", "1/2-1/2"]
+
+class GameLog():
+    """
+    GAMELOG CLASS:
+        append-only binary store of finished games
+
+        games are numbered from 0 in the order they were appended.
+        any game/ply can be read in O(1) through a memory map of the files.
+        several processes may append to the same log where fcntl is available (Linux, macOS),
+        each append holds an exclusive flock on the index file. elsewhere the log is
+        single-writer: only one process at a time may append to it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.moves_file = open_store(path + ".moves", MOVES_MAGIC)
+        self.index_file = open_store(path + ".index", INDEX_MAGIC)
+        self.moves_map = None
+        self.index_map = None
+
+    # Writing
+    def append_game(self, moves, result="*"):
+        """
+        ACTION method:
+            appends a game to the log, returns its game number.
+
+            moves is a list of "Move" objects (ex. a gamestate's past_moves),
+            result is one of "*", "1-0", "0-1", "1/2-1/2"
+        """
+        if fcntl is not None:
+            fcntl.flock(self.index_file.fileno(), fcntl.LOCK_EX)
+        try:
+            # The ends are found (and any partly written record from a crash cut off)
+            # while holding the lock, so another writer can't append in between
+            first = end_of_records(self.moves_file, MOVE_RECORD.size)
+            self.moves_file.write(b"".join(MOVE_RECORD.pack(encode_move(move)) for move in moves))
+            self.moves_file.flush()
+
+            game = end_of_records(self.index_file, INDEX_ENTRY.size)
+            self.index_file.write(INDEX_ENTRY.pack(first, len(moves), RESULTS.index(result), int(time.time())))
+            self.index_file.flush()
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self.index_file.fileno(), fcntl.LOCK_UN)
+        return game
+    def close(self):
+        """
+        ACTION method:
+            closes the log files (and memory maps)
+        """
+        if self.moves_map is not None:
+            self.moves_map.close()
+        if self.index_map is not None:
+            self.index_map.close()
+        self.moves_file.close()
+        self.index_file.close()
+
+    # Reading
+    def __len__(self):
+        self.__remap()
+        return (len(self.index_map) - HEADER_SIZE) // INDEX_ENTRY.size
+    def get_game_info(self, game):
+        """
+        READ method:
+            returns (ply count, result, unix time) for a game
+        """
+        _, plies, result, timestamp = self.__read_entry(game)
+        return plies, RESULTS[result], timestamp
+    def get_move(self, game, ply):
+        """
+        READ method:
+            returns the (start, end) squares of a move, ply counts from 0
+        """
+        first, plies, _, _ = self.__read_entry(game)
+        if not 0 <= ply < plies:
+            raise IndexError("ply %d out of range for game %d" % (ply, game))
+        offset = HEADER_SIZE + (first + ply) * MOVE_RECORD.size
+        return decode_move(MOVE_RECORD.unpack_from(self.moves_map, offset)[0])
+    def get_moves(self, game):
+        """
+        READ method:
+            returns the (start, end) squares of every move in a game
+        """
+        first, plies, _, _ = self.__read_entry(game)
+        offset = HEADER_SIZE + first * MOVE_RECORD.size
+        return [decode_move(record) for (record,) in MOVE_RECORD.iter_unpack(self.moves_map[offset:offset + plies * MOVE_RECORD.size])]
+    def replay(self, game, ply=None):
+        """
+        READ method:
+            returns a new Gamestate with the first "ply" moves of a game made
+            (the whole game if ply is None)
+        """
+        gs = Engine.Gamestate()
+        for start, end in self.get_moves(game)[:ply]:
+            gs.make_move(Engine.Move(start, end, gs.board))
+            gs.switch_turn()
+        return gs
+
+    # PGN export
+    def export_pgn(self, out, start=0, stop=None):
+        """
+        EXPORT method:
+            writes games [start, stop) to the file object "out" in PGN format,
+            one game at a time.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        for game in range(start, stop):
+            plies, result, timestamp = self.get_game_info(game)
+            out.write('[Event "PyChess game %d"]\n' % game)
+            out.write('[Site "?"]\n')
+            out.write('[Date "%s"]\n' % time.strftime("%Y.%m.%d", time.gmtime(timestamp)))
+            out.write('[Round "-"]\n')
+            out.write('[White "?"]\n')
+            out.write('[Black "?"]\n')
+            out.write('[Result "%s"]\n\n' % result)
+
+            gs = Engine.Gamestate()
+            tokens = []
+            for ply, (m_start, m_end) in enumerate(self.get_moves(game)):
+                if ply % 2 == 0:
+                    tokens.append("%d." % (ply // 2 + 1))
+                move = Engine.Move(m_start, m_end, gs.board)
+                tokens.append(to_san(gs, move))
+                gs.make_move(move)
+                gs.switch_turn()
+            tokens.append(result)
+
+            line = ""
+            for token in tokens:
+                if len(line) + len(token) + 1 > 80:
+                    out.write(line + "\n")
+                    line = token
+                else:
+                    line = token if line == "" else line + " " + token
+            out.write(line + "\n\n")
+
+    # Helper methods
+    def __read_entry(self, game):
+        """
+        HELPER METHOD:
+            returns the raw index entry of a game
+        """
+        self.__remap()
+        offset = HEADER_SIZE + game * INDEX_ENTRY.size
+        if game < 0 or offset + INDEX_ENTRY.size > len(self.index_map):
+            raise IndexError("game %d is not in the log" % game)
+        return INDEX_ENTRY.unpack_from(self.index_map, offset)
+    def __remap(self):
+        """
+        HELPER METHOD:
+            (re)maps the files if they have grown since they were last mapped
+        """
+        index_size = os.fstat(self.index_file.fileno()).st_size
+        if self.index_map is None or len(self.index_map) != index_size:
+            if self.index_map is not None:
+                self.index_map.close()
+                self.moves_map.close()
+            self.index_map = mmap.mmap(self.index_file.fileno(), index_size, access=mmap.ACCESS_READ)
+            self.moves_map = mmap.mmap(self.moves_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+def encode_move(move):
+    """
+    HELPER METHOD:
+        packs a "Move" into a 16 bit move record
+    """
+    return (move.start[0] * 8 + move.start[1]) | (move.end[0] * 8 + move.end[1]) << 6
+def decode_move(record):
+    """
+    HELPER METHOD:
+        unpacks a 16 bit move record into (start, end) squares
+    """
+    return (((record & 63) // 8, record & 7), ((record >> 6 & 63) // 8, record >> 6 & 7))
+def to_san(gs, move):
+    """
+    HELPER METHOD:
+        returns "move" in standard algebraic notation (ex. "Nf3", "exd5", "e8=Q+")
+    REQUIRES: move is valid in gs
+    MODIFIES: none
+    """
+    piece = move.piece1[1]
+    square = chr(97 + move.end[1]) + str(8 - move.end[0])
+    capture = "x" if move.piece2 != "  " else ""
+    if piece == 'p':
+        san = (chr(97 + move.start[1]) if capture else "") + capture + square
+        if move.end[0] in (0, 7):
+            san += "=Q"
+    else:
+        # Disambiguate between identical pieces that can reach the same square
+        others = [other for other in gs.gen_valid_moves()
+                  if other.end == move.end and other.piece1 == move.piece1 and other.start != move.start]
+        prefix = ""
+        if len(others) != 0:
+            if all(other.start[1] != move.start[1] for other in others):
+                prefix = chr(97 + move.start[1])
+            elif all(other.start[0] != move.start[0] for other in others):
+                prefix = str(8 - move.start[0])
+            else:
+                prefix = chr(97 + move.start[1]) + str(8 - move.start[0])
+        san = piece.upper() + prefix + capture + square
+
+    gs.make_move(move)
+    gs.switch_turn()
+    if gs.is_checkmate():
+        san += "#"
+    elif gs.is_check():
+        san += "+"
+    gs.switch_turn()
+    gs.undo_move()
+    return san
+def open_store(path, magic):
+    """
+    HELPER METHOD:
+        opens (or creates) one of the log files and checks its header
+    """
+    try:
+        with open(path, "xb") as f:         # Fails if another process got there first
+            f.write(magic)
+    except FileExistsError:
+        pass
+    store = open(path, "r+b")
+    header = store.read(HEADER_SIZE)
+    if header == b"":                       # Its creator hasn't written the header yet (or crashed first)
+        store.write(magic)
+        store.flush()
+        header = magic
+    if header != magic:
+        store.close()
+        raise ValueError("%s is not a game log file" % path)
+    return store
+def end_of_records(store, record_size):
+    """
+    HELPER METHOD:
+        returns the number of whole records in a log file, and leaves it positioned
+        just after them (a partly written record at the end, from a crash mid-append, is cut off)
+    REQUIRES: the caller holds the log's append lock
+    """
+    size = os.fstat(store.fileno()).st_size
+    records = (size - HEADER_SIZE) // record_size
+    store.seek(HEADER_SIZE + records * record_size)
+    store.truncate()
+    return records
+
+if __name__ == "__main__":
+    # Usage: python3 GameLog.py <log path> [first game] [last game]
+    log = GameLog(sys.argv[1])
+    first = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    last = int(sys.argv[3]) + 1 if len(sys.argv) > 3 else None
+    log.export_pgn(sys.stdout, first, last)
+    log.close()
@@ -0,0 +1,52 @@
+class HashTable():
+    """
+    HASHTABLE CLASS:
+        fixed size table of values keyed by 64 bit position hashes (ex. Gamestate.hash)
+
+        each key has exactly one slot (key % size), storing always replaces what was there,
+        so the table never grows past "size" entries.
+        counts probes and hits so that hit rates can be reported.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.keys = [None] * size
+        self.values = [None] * size
+        self.probes = 0
+        self.hits = 0
+    def probe(self, key):
+        """
+        TABLE method:
+            returns the value stored for key, or None if it is not in the table.
+        """
+        self.probes += 1
+        slot = key % self.size
+        if self.keys[slot] == key:
+            self.hits += 1
+            return self.values[slot]
+        return None
+    def store(self, key, value):
+        """
+        TABLE method:
+            stores value for key, replacing whatever was in its slot.
+        """
+        slot = key % self.size
+        self.keys[slot] = key
+        self.values[slot] = value
+    def clear(self):
+        """
+        TABLE method:
+            empties the table and resets the hit counts.
+        """
+        self.keys = [None] * self.size
+        self.values = [None] * self.size
+        self.probes = 0
+        self.hits = 0
+    def hit_rate(self):
+        """
+        TABLE method:
+            returns the fraction of probes that were hits (0 if nothing was probed).
+        """
+        if self.probes == 0:
+            return 0
+        return self.hits / self.probes
@@ -0,0 +1,191 @@
+import random
+import sys
+import time
+
+import Engine
+import HashTable
+
+INFINITY = 1000000000
+MAX_MATE_DEPTH = 64
+
+# Mixed into the position hash so the same position with a different number of moves left
+# gets a different table entry
+DEPTH_RNG = random.Random(2033)
+DEPTH_KEYS = [DEPTH_RNG.getrandbits(64) for _ in range(MAX_MATE_DEPTH + 1)]
+
+class MateSolver():
+    """
+    MATESOLVER CLASS:
+        proves or refutes "side to move mates in n moves" with depth-first proof-number search
+
+        every node has a proof and disproof number, stored as (phi, delta) from the point of
+        view of the side to move there: phi is the work left to prove that side wins, delta
+        the work left to prove it loses. (INFINITY, 0) means the side to move is lost, (0, INFINITY)
+        that it survives. the search always expands the most promising node first, so forced
+        mates are found without looking at most of the defender's hopeless options.
+
+        nodes are kept in a HashTable of "table_size" entries (newer nodes replace older ones),
+        the search gives up after "max_nodes" nodes.
+    """
+
+    def __init__(self, table_size=1 << 18, max_nodes=1000000):
+        self.table_size = table_size
+        self.max_nodes = max_nodes
+        self.table = HashTable.HashTable(table_size)
+        self.nodes = 0      # Nodes visited by the last solve or find_mate call
+        self.pv = []        # Mating line found by the last successful solve call
+    def solve(self, gs, n):
+        """
+        SOLVE method:
+            returns True if the current player can force checkmate within n moves,
+            False if it can't, None if max_nodes ran out before either was proven.
+            the mating line is left in self.pv, the nodes searched in self.nodes.
+        REQUIRES: 1 <= n <= MAX_MATE_DEPTH
+        MODIFIES: none (gs is restored)
+        """
+        self.nodes = 0
+        return self.__solve(gs, n)
+    def find_mate(self, gs, max_n):
+        """
+        SOLVE method:
+            returns the smallest n <= max_n for which the current player mates in n,
+            0 if there is no mate within max_n moves, None if max_nodes ran out first.
+            self.nodes and the max_nodes budget cover all of the n tried, not just the last.
+        """
+        self.nodes = 0
+        for n in range(1, max_n + 1):
+            result = self.__solve(gs, n)
+            if result is None:
+                return None
+            if result:
+                return n
+        return 0
+
+    # Helper methods
+    def __solve(self, gs, n):
+        """
+        HELPER METHOD:
+            solve without resetting self.nodes, so that find_mate's calls share one budget
+        """
+        if self.table.size != self.table_size:
+            self.table = HashTable.HashTable(self.table_size)
+        self.pv = []
+        phi, delta = self.__mid(gs, INFINITY, INFINITY, n, True)
+        if phi == 0:
+            self.pv = self.__mating_line(gs, n)
+            return True
+        if delta == 0:
+            return False
+        return None
+    def __mid(self, gs, phi_th, delta_th, depth, attacking):
+        """
+        HELPER METHOD:
+            searches below gs until its (phi, delta) reach the thresholds, returns (phi, delta)
+
+            depth is the number of moves the attacker has left, attacking is true if the
+            attacker is the side to move (an OR node), false for the defender (an AND node).
+        """
+        self.nodes += 1
+        key = gs.hash ^ DEPTH_KEYS[depth]
+        stored = self.table.probe(key)
+        if stored is not None and (stored[0] >= phi_th or stored[1] >= delta_th):
+            return stored
+
+        # Terminal nodes
+        if not attacking and depth == 0:
+            values = (INFINITY, 0) if gs.is_checkmate() else (0, INFINITY)
+            self.table.store(key, values)
+            return values
+        moves = gs.gen_valid_moves()
+        if len(moves) == 0:
+            values = (INFINITY, 0) if attacking or gs.is_check() else (0, INFINITY)
+            self.table.store(key, values)
+            return values
+
+        # Children start with their stored numbers, or (1, 1) if they have never been searched
+        child_depth = depth - 1 if attacking else depth
+        children = []
+        for move in moves:
+            gs.make_move(move)
+            gs.switch_turn()
+            children.append(self.table.probe(gs.hash ^ DEPTH_KEYS[child_depth]) or (1, 1))
+            gs.switch_turn()
+            gs.undo_move()
+
+        while True:
+            phi = min(child_delta for _, child_delta in children)
+            delta = min(sum(child_phi for child_phi, _ in children), INFINITY)
+            if phi >= phi_th or delta >= delta_th or self.nodes >= self.max_nodes:
+                self.table.store(key, (phi, delta))
+                return phi, delta
+
+            # Expand the child closest to refuting it for the side to move (smallest delta)
+            best = 0
+            second_delta = INFINITY
+            for i in range(1, len(children)):
+                if children[i][1] < children[best][1]:
+                    second_delta = children[best][1]
+                    best = i
+                elif children[i][1] < second_delta:
+                    second_delta = children[i][1]
+            child_phi_th = min(delta_th - delta + children[best][0], INFINITY)
+            child_delta_th = min(phi_th, second_delta + 1)
+
+            gs.make_move(moves[best])
+            gs.switch_turn()
+            children[best] = self.__mid(gs, child_phi_th, child_delta_th, child_depth, not attacking)
+            gs.switch_turn()
+            gs.undo_move()
+    def __mating_line(self, gs, n):
+        """
+        HELPER METHOD:
+            follows proven nodes in the table from gs, returns the moves of the mating line
+            (may stop early if a node was replaced in the table)
+        """
+        line = []
+        depth = n
+        attacking = True
+        while depth > 0 or not attacking:
+            next_move = None
+            child_depth = depth - 1 if attacking else depth
+            for move in gs.gen_valid_moves():
+                gs.make_move(move)
+                gs.switch_turn()
+                values = self.table.probe(gs.hash ^ DEPTH_KEYS[child_depth])
+                gs.switch_turn()
+                gs.undo_move()
+                if values is not None and values[0 if attacking else 1] == INFINITY:
+                    next_move = move        # Attacker: a move the defender loses after
+                    break                   # Defender: every move loses, take any proven one
+            if next_move is None:
+                break
+            line.append(next_move)
+            gs.make_move(next_move)
+            gs.switch_turn()
+            depth = child_depth
+            attacking = not attacking
+        for _ in line:
+            gs.switch_turn()
+            gs.undo_move()
+        return line
+
+if __name__ == "__main__":
+    # Usage: python3 MateSolver.py <puzzle file>
+    #   one puzzle per line: "<FEN>;<n>", checks that the side to move mates in exactly n
+    solver = MateSolver()
+    solved = 0
+    total = 0
+    start = time.perf_counter()
+    with open(sys.argv[1]) as puzzles:
+        for line in puzzles:
+            if line.strip() == "" or line.startswith("#"):
+                continue
+            fen, n = line.rsplit(";", 1)
+            gs = Engine.Gamestate()
+            gs.load_fen(fen)
+            found = solver.find_mate(gs, int(n))
+            total += 1
+            if found == int(n):
+                solved += 1
+            print("%-60s mate in %s: %-6s %8d nodes" % (fen.strip(), n.strip(), found, solver.nodes))
+    print("%d/%d solved in %.2fs" % (solved, total, time.perf_counter() - start))
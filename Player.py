@@ -1,4 +1,5 @@
 import Engine
+import HashTable
 import random
 import time
 
@@ -52,6 +53,42 @@ class AIPlayer(Player):
     def __init__(self, color):
         super().__init__(color)
         self.DEPTH = 2
+
+        # Selective search options
+        self.NULL_MOVE = True       # Null-move pruning
+        self.NULL_MOVE_R = 2        # Depth reduction for the null-move search
+        self.LMR = True             # Late move reductions
+        self.LMR_FULL_MOVES = 3     # Moves searched at full depth before reducing
+        self.LMR_MIN_DEPTH = 2      # Smallest remaining depth where moves get reduced
+
+        # Window options
+        self.PVS = True             # Null-window searches for moves after the first
+        self.ASPIRATION = True      # Narrow root window around the last iteration's score
+        self.ASPIRATION_WINDOW = 100 # Half-width of the aspiration window
+
+        # Move ordering
+        self.KILLERS = 2            # Killer moves remembered per ply
+        self.killers = []           # killers[ply] is a list of quiet moves that caused cutoffs, kept between moves
+        self.TT_SIZE = 65536        # Entries in the transposition table (0 turns it off)
+        self.tt = None              # HashTable of position hash -> (depth, score, bound, best move), kept between moves
+
+        # Evaluation
+        self.PAWN_STRUCTURE = True  # Score doubled/isolated/passed pawns
+        self.EVAL_CACHE_SIZE = 65536 # Entries in the evaluation cache (0 turns it off)
+        self.PAWN_HASH_SIZE = 4096  # Entries in the pawn structure table (0 turns it off)
+        self.eval_cache = None      # HashTable of position hash -> score, kept between moves
+        self.pawn_table = None      # HashTable of pawn hash -> pawn structure score, kept between moves
+
+        # Set from another thread to end a running search early (get_move then returns None)
+        self.stopped = False
+
+        # Results of the last get_move call
+        self.nodes = 0              # Nodes visited
+        self.researches = 0         # Null-window/reduced searches that had to be redone
+        self.aspiration_fails = 0   # Root searches that fell outside the aspiration window
+        self.score = 0              # Score of the best move, from the mover's point of view
+        self.pv = []                # Principal variation, starting with the best move
+        self.iterations = []        # (depth, score, nodes) for each iterative deepening pass
     def get_name(self):
         """
         GUI method:
@@ -63,50 +100,232 @@ class AIPlayer(Player):
         MOVE method:
             takes in a gamestate, returns the best move.
             if no valid moves are available, returns None.
+
+            searches with iterative deepening up to DEPTH + 1 plies, each pass
+            inside an aspiration window around the previous pass's score.
+            the principal variation is left in self.pv.
+            returns None if self.stopped is set during the search.
         """
-        moves_to_look_at = gs.gen_valid_moves()
-        if len(moves_to_look_at) == 0:
+        self.nodes = 0
+        self.researches = 0
+        self.aspiration_fails = 0
+        self.score = 0
+        self.pv = []
+        self.iterations = []
+        while len(self.killers) < self.DEPTH + 2:
+            self.killers.append([])
+        self.tt = resize_table(self.tt, self.TT_SIZE)
+        self.eval_cache = resize_table(self.eval_cache, self.EVAL_CACHE_SIZE)
+        self.pawn_table = resize_table(self.pawn_table, self.PAWN_HASH_SIZE)
+        if next(gs.gen_staged_moves(), None) is None:
             print("Out of moves")
-        best_move = None
-        best_score = 1000000
-        for move in moves_to_look_at:
+            return None
+
+        player, plies = gs.current_player, len(gs.past_moves)
+        try:
+            self.__deepen(gs)
+        except SearchStopped:
+            while len(gs.past_moves) > plies:       # Take back the moves the search was inside
+                gs.undo_move()
+            if gs.current_player != player:
+                gs.switch_turn()
+            return None
+        return self.pv[0]
+    def __deepen(self, gs):
+        """
+        HELPER METHOD:
+            iterative deepening passes of get_move, leaves the result in self.score/self.pv
+        """
+        for depth in range(1, self.DEPTH + 2):
+            alpha, beta = -INFINITY, INFINITY
+            if self.ASPIRATION and depth > 1:
+                alpha = self.score - self.ASPIRATION_WINDOW
+                beta = self.score + self.ASPIRATION_WINDOW
+            while True:
+                pv = []
+                score = self.negamax(gs, alpha, beta, depth, pv, self.pv, False)
+                if score <= alpha and alpha > -INFINITY:    # Fail low, re-widen
+                    self.aspiration_fails += 1
+                    alpha = -INFINITY
+                elif score >= beta and beta < INFINITY:     # Fail high, re-widen
+                    self.aspiration_fails += 1
+                    beta = INFINITY
+                else:
+                    break
+            self.score = score
+            self.pv = pv
+            self.iterations.append((depth, score, self.nodes))
+    def negamax(self, gs, alpha, beta, depth, pv, hint=(), allow_null=True, ply=0):
+        """
+        SEARCH method:
+            returns the score of gs from the current player's point of view,
+            clamped to the (alpha, beta) window.
+
+            fills "pv" with the best line found when the score lands inside the window.
+            "hint" is a line to try first (usually the previous iteration's pv).
+            "ply" is the distance from the root, used to look up killer moves.
+        """
+        self.nodes += 1
+        if self.stopped:
+            raise SearchStopped()
+        if depth <= 0:
+            return self.evaluate(gs)
+
+        # Transposition table: a result from an earlier search of this position that
+        # was at least as deep can settle a null-window search, otherwise its best
+        # move is tried first
+        hash_move = hint[0] if len(hint) != 0 else None
+        entry = self.tt.probe(gs.hash) if self.tt is not None else None
+        if entry is not None:
+            tt_depth, tt_score, tt_bound, tt_move = entry
+            if tt_depth >= depth and beta - alpha == 1:
+                if tt_bound != UPPER_BOUND and tt_score >= beta:
+                    return beta
+                if tt_bound != LOWER_BOUND and tt_score <= alpha:
+                    return alpha
+            if hash_move is None:
+                hash_move = tt_move
+
+        in_check = gs.is_check()
+
+        # Null-move pruning: let the opponent move twice, if we still fail high
+        # the real moves will too. Skipped with only pawns left (zugzwang), and
+        # verified with a reduced normal search in endgames.
+        if self.NULL_MOVE and allow_null and depth >= 2 and len(hint) == 0 and not in_check and has_pieces(gs, gs.current_player):
+            gs.switch_turn()
+            score = -self.negamax(gs, -beta, -beta + 1, max(depth - 1 - self.NULL_MOVE_R, 0), [], (), False, ply + 1)
+            gs.switch_turn()
+            if score >= beta:
+                if not is_endgame(gs):
+                    return beta
+                score = self.negamax(gs, alpha, beta, max(depth - self.NULL_MOVE_R, 1), [], (), False, ply)
+                if score >= beta:
+                    return beta
+
+        killers = self.killers[ply] if ply < len(self.killers) else []
+        moves_to_look_at = gs.gen_staged_moves(hash_move, killers)
+        original_alpha = alpha
+        i = -1
+        for i, move in enumerate(moves_to_look_at):
             gs.make_move(move)
             gs.switch_turn()
-            score = self.minimax(gs, True, -1000000, 1000000, self.DEPTH)
+            child_pv = []
+            child_hint = hint[1:] if i == 0 else ()
+
+            # Late move reductions: quiet moves late in the ordering get a reduced
+            # null-window search first, and a full search only if they look good.
+            reduced = (self.LMR and i >= self.LMR_FULL_MOVES and depth >= self.LMR_MIN_DEPTH
+                       and not in_check and is_quiet(move) and not gs.is_check())
+            score = alpha + 1
+            if reduced:
+                score = -self.negamax(gs, -alpha - 1, -alpha, depth - 2, child_pv, (), True, ply + 1)
+                if score > alpha:
+                    self.researches += 1
+
+            # Principal variation search: after the first move, only prove that
+            # the move is no better than alpha, and re-search if that fails.
+            if score > alpha:
+                if i == 0 or not self.PVS:
+                    score = -self.negamax(gs, -beta, -alpha, depth - 1, child_pv, child_hint, True, ply + 1)
+                else:
+                    score = -self.negamax(gs, -alpha - 1, -alpha, depth - 1, child_pv, child_hint, True, ply + 1)
+                    if alpha < score < beta:
+                        self.researches += 1
+                        score = -self.negamax(gs, -beta, -alpha, depth - 1, child_pv, child_hint, True, ply + 1)
+
             gs.switch_turn()
             gs.undo_move()
-            if score < best_score:
-                best_score = score
-                best_move = move
-        return best_move
-    def minimax(self, gs, isMaximizingPlayer, alpha, beta, depth):
-        if depth == 0:
-            if isMaximizingPlayer:
-                return 2*evaluate_pieces(gs) + evaluate_positioning(gs)
+            if score >= beta:
+                if is_quiet(move) and move not in killers and ply < len(self.killers):
+                    killers.insert(0, move)
+                    del killers[self.KILLERS:]
+                if self.tt is not None:
+                    self.tt.store(gs.hash, (depth, beta, LOWER_BOUND, move))
+                return beta
+            if score > alpha:
+                alpha = score
+                pv[:] = [move] + child_pv
+        if i == -1:                 # No valid moves
+            return -CHECKMATE_SCORE if in_check else 0
+        if self.tt is not None:
+            if alpha > original_alpha:
+                self.tt.store(gs.hash, (depth, alpha, EXACT, pv[0]))
             else:
-                return -(2*evaluate_pieces(gs) + evaluate_positioning(gs))
-        if not isMaximizingPlayer:
-            moves_to_look_at = gs.gen_valid_moves()
-            for move in moves_to_look_at:
-                gs.make_move(move)
-                gs.switch_turn()
-                beta = min(beta, self.minimax(gs, not isMaximizingPlayer, alpha, beta, depth-1))
-                gs.switch_turn()
-                gs.undo_move()
-                if beta <= alpha:
-                    return beta
-            return beta
-        elif isMaximizingPlayer:
-            moves_to_look_at = gs.gen_valid_moves()
-            for move in moves_to_look_at:
-                gs.make_move(move)
-                gs.switch_turn()
-                alpha = max(alpha, self.minimax(gs, not isMaximizingPlayer, alpha, beta, depth-1))
-                gs.switch_turn()
-                gs.undo_move()
-                if beta <= alpha:
-                    return alpha
-            return alpha
+                self.tt.store(gs.hash, (depth, alpha, UPPER_BOUND, None))
+        return alpha
+
+    def evaluate(self, gs):
+        """
+        SEARCH method:
+            returns the static score of gs from the current player's point of view,
+            looked up in the evaluation cache first.
+        """
+        if self.eval_cache is not None:
+            score = self.eval_cache.probe(gs.hash)
+            if score is not None:
+                return score
+        score = 2*evaluate_pieces(gs) + evaluate_positioning(gs)
+        if self.PAWN_STRUCTURE:
+            score += evaluate_pawn_structure(gs, self.pawn_table)
+        if self.eval_cache is not None:
+            self.eval_cache.store(gs.hash, score)
+        return score
+
+# Methods for move ordering / selective search (used by AI player)
+INFINITY = 1000000
+CHECKMATE_SCORE = 500000
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2     # Transposition table score types
+
+class SearchStopped(Exception):
+    """
+    Raised inside AIPlayer.negamax when the search was stopped, unwinds to get_move
+    """
+def is_quiet(move):
+    """
+    HELPER METHOD:
+        returns true if the move is not a capture or a pawn promotion.
+    """
+    if move.piece2 != "  ":
+        return False
+    if move.piece1[1] == 'p' and move.end[0] in (0, 7):
+        return False
+    return True
+def has_pieces(gs, color):
+    """
+    HELPER METHOD:
+        returns true if "color" has anything other than its king and pawns.
+    """
+    for row in range(8):
+        for col in range(8):
+            if gs.board[row][col][0] == color and gs.board[row][col][1] not in "pk":
+                return True
+    return False
+def is_endgame(gs):
+    """
+    HELPER METHOD:
+        returns true if both sides together have at most a rook and a minor
+        piece each left (not counting kings and pawns).
+    """
+    material = 0
+    for row in range(8):
+        for col in range(8):
+            if gs.board[row][col][1] in "nbrq":
+                material += Engine.PIECE_VALUES[gs.board[row][col][1]]
+    return material <= 2 * (Engine.PIECE_VALUES['r'] + Engine.PIECE_VALUES['b'])
+
+def resize_table(table, size):
+    """
+    HELPER METHOD:
+        returns "table" with its hit counts reset, a new HashTable if its size
+        no longer matches "size", or None if size is 0.
+    """
+    if size == 0:
+        return None
+    if table is None or table.size != size:
+        return HashTable.HashTable(size)
+    table.probes = 0
+    table.hits = 0
+    return table
 
 # Methods for gamestate evaluation (used by AI player)
 def evaluate_mobility(gs):
@@ -166,6 +385,52 @@ def evaluate_positioning(gs):
             else:
                 score -= piece_score
     return score                 
+DOUBLED_PAWN_PENALTY = 10
+ISOLATED_PAWN_PENALTY = 15
+PASSED_PAWN_BONUS = [0, 10, 15, 25, 40, 60]   # By number of rows advanced
+def evaluate_pawn_structure(gs, pawn_table=None):
+    """
+    EVALUATION method:
+        scores doubled, isolated and passed pawns from the current player's point of view.
+        only depends on where the pawns are, so results are kept in "pawn_table"
+        (a HashTable keyed by gs.pawn_hash) if one is passed in.
+    """
+    score = pawn_table.probe(gs.pawn_hash) if pawn_table is not None else None
+    if score is None:
+        score = __score_pawns(gs, 'w') - __score_pawns(gs, 'b')     # White's point of view
+        if pawn_table is not None:
+            pawn_table.store(gs.pawn_hash, score)
+    return score if gs.current_player == 'w' else -score
+def __score_pawns(gs, color):
+    pawns = []
+    enemy_pawns = []
+    for row in range(8):
+        for col in range(8):
+            if gs.board[row][col][1] == 'p':
+                if gs.board[row][col][0] == color:
+                    pawns.append((row, col))
+                else:
+                    enemy_pawns.append((row, col))
+    files = [0] * 8
+    for (row, col) in pawns:
+        files[col] += 1
+
+    score = 0
+    for count in files:
+        if count > 1:
+            score -= DOUBLED_PAWN_PENALTY * (count - 1)
+    for (row, col) in pawns:
+        if (col == 0 or files[col - 1] == 0) and (col == 7 or files[col + 1] == 0):
+            score -= ISOLATED_PAWN_PENALTY
+        passed = True
+        for (e_row, e_col) in enemy_pawns:
+            ahead = e_row < row if color == 'w' else e_row > row
+            if ahead and abs(e_col - col) <= 1:
+                passed = False
+                break
+        if passed:
+            score += PASSED_PAWN_BONUS[6 - row if color == 'w' else row - 1]
+    return score
 def __evaluate_pawn(gs, pos): 
     pawn_color = gs.board[pos[0]][pos[1]][0]
     pawn_table = [
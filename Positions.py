@@ -0,0 +1,31 @@
+import Engine
+
+# Fixed position suite used for search comparisons and benchmarks.
+# Only piece placement and side to move matter to the engine.
+SUITE = [
+    ("start",       "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w"),
+    ("italian",     "r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w"),
+    ("middlegame",  "r2q1rk1/pp2bppp/2n1pn2/3p4/3P4/2NBPN2/PP3PPP/R2Q1RK1 w"),
+    ("tactics",     "r1b1kb1r/pppp1ppp/5q2/4n3/3KP3/2N3PN/PPP4P/R1BQ1B1R b"),
+    ("rook_ending", "8/5pk1/6p1/8/3R4/6P1/5PK1/3r4 w"),
+    ("pawn_ending", "8/8/4k3/4p3/4P3/4K3/8/8 w"),
+]
+
+def load(name):
+    """
+    HELPER METHOD:
+        returns a new Gamestate set up with the suite position called "name"
+    """
+    for position_name, fen in SUITE:
+        if position_name == name:
+            gs = Engine.Gamestate()
+            gs.load_fen(fen)
+            return gs
+    raise KeyError(name)
+
+def all_positions():
+    """
+    HELPER METHOD:
+        returns a list of (name, Gamestate) pairs, one for every suite position
+    """
+    return [(name, load(name)) for name, _ in SUITE]
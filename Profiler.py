@@ -0,0 +1,166 @@
+import collections
+import os
+import sys
+import threading
+import time
+
+import Engine
+import Player
+import Positions
+
+# Entry points that get call counters while profiling, as (owner, attribute name)
+COUNTED = [
+    (Engine.Gamestate, "gen_possible_moves"),
+    (Engine.Gamestate, "is_check"),
+    (Engine.Gamestate, "make_move"),
+    (Player, "evaluate_pieces"),
+    (Player, "evaluate_positioning"),
+    (Player, "evaluate_pawn_structure"),
+]
+
+class Profiler():
+    """
+    PROFILER CLASS:
+        statistical profiler for headless runs
+
+        a background thread looks at the profiled thread's stack every "interval" seconds
+        and counts how often each stack is seen, nothing is added to the profiled code
+        itself, so small hot functions keep their real cost.
+        optionally counts calls to the entry points in COUNTED (this does wrap them, and
+        adds a little to each call).
+    """
+
+    def __init__(self, interval=0.001, counters=True):
+        self.interval = interval
+        self.counters = counters
+        self.stacks = collections.Counter()     # "root;...;leaf" -> samples
+        self.calls = collections.Counter()      # entry point name -> calls
+        self.samples = 0
+        self.elapsed = 0
+
+        self.__running = False
+        self.__thread = None
+        self.__originals = []
+        self.__start_time = 0
+        self.__switch_interval = 0
+
+    # Profiling
+    def start(self):
+        """
+        ACTION method:
+            starts sampling the calling thread (and counting calls, if enabled)
+        """
+        if self.counters:
+            for owner, name in COUNTED:
+                original = getattr(owner, name)
+                self.__originals.append((owner, name, original))
+                setattr(owner, name, count_calls(original, name, self.calls))
+        # Let the sampler thread get the GIL as often as it wants to sample
+        self.__switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self.interval, self.__switch_interval))
+
+        self.__running = True
+        self.__start_time = time.perf_counter()
+        self.__thread = threading.Thread(target=self.__sample, args=(threading.get_ident(),), daemon=True)
+        self.__thread.start()
+    def stop(self):
+        """
+        ACTION method:
+            stops sampling and puts back the original entry points
+        """
+        self.__running = False
+        self.__thread.join()
+        self.elapsed += time.perf_counter() - self.__start_time
+        sys.setswitchinterval(self.__switch_interval)
+        for owner, name, original in self.__originals:
+            setattr(owner, name, original)
+        self.__originals = []
+
+    # Output
+    def write_collapsed(self, out):
+        """
+        OUTPUT method:
+            writes the sampled stacks to "out" in collapsed stack format,
+            one "frame;frame;frame count" line per stack (flamegraph.pl, speedscope, inferno)
+        """
+        for stack, count in sorted(self.stacks.items()):
+            out.write("%s %d\n" % (stack, count))
+    def write_report(self, out, top=15):
+        """
+        OUTPUT method:
+            writes a short text summary: entry point call counts and the
+            functions with the most samples (self and total)
+        """
+        out.write("%d samples in %.2fs\n\n" % (self.samples, self.elapsed))
+        if len(self.calls) != 0:
+            out.write("%-28s %12s %12s\n" % ("entry point", "calls", "calls/s"))
+            for _, name in COUNTED:
+                out.write("%-28s %12d %12.0f\n" % (name, self.calls[name], self.calls[name] / max(self.elapsed, 1e-9)))
+            out.write("\n")
+
+        own = collections.Counter()
+        total = collections.Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        out.write("%-50s %8s %8s\n" % ("function", "self%", "total%"))
+        for frame, count in own.most_common(top):
+            out.write("%-50s %7.1f%% %7.1f%%\n" % (frame, 100 * count / self.samples, 100 * total[frame] / self.samples))
+
+    # Helper methods
+    def __sample(self, thread_id):
+        """
+        HELPER METHOD:
+            sampling loop, runs on the profiler thread until stop is called
+        """
+        while self.__running:
+            time.sleep(self.interval)
+            frame = sys._current_frames().get(thread_id)
+            frames = []
+            while frame is not None:
+                if frame.f_code is not COUNTER_CODE:
+                    code = frame.f_code
+                    frames.append("%s:%s" % (os.path.basename(code.co_filename), getattr(code, "co_qualname", code.co_name)))
+                frame = frame.f_back
+            if len(frames) != 0:
+                self.stacks[";".join(reversed(frames))] += 1
+                self.samples += 1
+
+def count_calls(function, name, calls):
+    """
+    HELPER METHOD:
+        returns "function" wrapped so that each call adds one to calls[name]
+    """
+    def counted(*args, **kwargs):
+        calls[name] += 1
+        return function(*args, **kwargs)
+    counted.__name__ = function.__name__
+    counted.__doc__ = function.__doc__
+    return counted
+COUNTER_CODE = count_calls(count_calls, None, None).__code__    # Hidden from sampled stacks
+
+def profile_search(depth=2, interval=0.001, counters=True):
+    """
+    HELPER METHOD:
+        runs an AIPlayer search on every position of the suite under the profiler,
+        returns the Profiler
+    """
+    profiler = Profiler(interval, counters)
+    profiler.start()
+    for _, gs in Positions.all_positions():
+        ai = Player.AIPlayer(gs.current_player)
+        ai.DEPTH = depth
+        ai.get_move(gs)
+    profiler.stop()
+    return profiler
+
+if __name__ == "__main__":
+    # Usage: python3 Profiler.py [depth] [collapsed stack output file]
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    profiler = profile_search(depth)
+    profiler.write_report(sys.stdout)
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "w") as out:
+            profiler.write_collapsed(out)
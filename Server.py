@@ -0,0 +1,329 @@
+import asyncio
+import collections
+import concurrent.futures
+import itertools
+import json
+import os
+import sys
+import time
+
+import Engine
+import Player
+
+# Server options
+HOST = "127.0.0.1"
+PORT = 8765
+WORKERS = os.cpu_count() or 1   # Worker processes
+MAX_QUEUE = 256                 # Jobs waiting for a worker before requests are held back
+LATENCY_WINDOW = 1000           # Jobs kept for the latency percentiles
+DEFAULT_DEPTH = 2
+MAX_DEPTH = 3                   # Deepest search a client can ask for, keeps move times short
+
+class Session():
+    """
+    SESSION CLASS:
+        one game hosted by the server
+
+        contains the game (self.gs) and the engine's search depth (self.depth)
+        contains the game's status and valid moves, as worked out by a worker (self.status, self.moves)
+        contains whether a job for this game is queued or running (self.busy),
+            a game only ever has one job at a time.
+    """
+
+    def __init__(self, game_id, depth):
+        self.game_id = game_id
+        self.gs = Engine.Gamestate()
+        self.depth = depth
+        self.status = "playing"
+        self.moves = []
+        self.busy = False
+
+class Server():
+    """
+    SERVER CLASS:
+        hosts many games at once over a local socket
+
+        clients send one JSON object per line and get one JSON object per line back:
+            {"cmd": "new", "color": "w", "depth": 2}        new game, the engine plays the other color
+            {"cmd": "move", "game": 1, "move": "e2e4"}      play a move, the engine answers
+            {"cmd": "go", "game": 1}                        the engine moves for the side to move
+            {"cmd": "state", "game": 1}                     position, status and valid moves
+            {"cmd": "close", "game": 1}                     end a game
+            {"cmd": "stats"}                                queue depth and latency metrics
+        moves are written as start and end squares (ex. "e2e4"), depth is 0 to MAX_DEPTH.
+        a game can only be used from the connection that made it, and is closed when
+        that connection closes.
+
+        everything that generates moves (checking the client's move, the game status and
+        valid moves, engine searches) runs as a job in a pool of WORKERS processes, so the
+        event loop never does more than make the moves the workers send back.
+        jobs are queued first come, first served, one per game at most, so a busy game
+        can't starve the others. when MAX_QUEUE jobs are waiting, new requests wait for
+        room, and the server stops reading from their connections until there is some.
+    """
+
+    def __init__(self, workers=WORKERS, max_queue=MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pool = None
+        self.queue = None
+        self.sessions = {}
+        self.game_ids = itertools.count(1)
+
+        # Metrics
+        self.searching = 0                                      # Jobs running in the pool
+        self.completed = 0                                      # Jobs finished
+        self.max_queue_depth = 0                                # Most jobs seen waiting at once
+        self.waits = collections.deque(maxlen=LATENCY_WINDOW)   # Seconds spent queued
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW) # Seconds from queued to done
+        self.nodes = 0                                          # Nodes searched by all workers
+
+    # Running
+    async def serve(self, host=HOST, port=PORT):
+        """
+        SERVER method:
+            starts the worker pool and accepts clients until cancelled
+        """
+        self.pool = concurrent.futures.ProcessPoolExecutor(self.workers)
+        self.queue = asyncio.Queue(self.max_queue)
+        dispatchers = [asyncio.create_task(self.__dispatch()) for _ in range(self.workers)]
+        server = await asyncio.start_server(self.__handle_client, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for dispatcher in dispatchers:
+                dispatcher.cancel()
+            self.pool.shutdown(cancel_futures=True)
+
+    # Requests
+    async def handle_request(self, request, owned):
+        """
+        SERVER method:
+            runs one request (a dict), returns the response (a dict).
+            "owned" is the set of game ids belonging to the connection.
+        """
+        cmd = request.get("cmd")
+        if cmd == "stats":
+            return self.get_stats()
+        if cmd == "new":
+            depth = request.get("depth", DEFAULT_DEPTH)
+            if type(depth) != int or not 0 <= depth <= MAX_DEPTH:
+                return {"error": "depth must be a whole number from 0 to %d" % MAX_DEPTH}
+            session = Session(next(self.game_ids), depth)
+            self.sessions[session.game_id] = session
+            owned.add(session.game_id)
+            return await self.__run(session, None, request.get("color", 'w') != session.gs.current_player)
+
+        if request.get("game") not in owned:
+            return {"error": "no such game"}
+        session = self.sessions[request["game"]]
+        if cmd == "state":
+            return self.__describe(session)
+        if cmd == "close":
+            del self.sessions[session.game_id]
+            owned.discard(session.game_id)
+            return {"game": session.game_id, "closed": True}
+        if session.busy:
+            return {"error": "game is busy with an earlier request"}
+        if cmd == "go":
+            return await self.__run(session, None, True)
+        if cmd == "move":
+            return await self.__run(session, str(request.get("move", "")), True)
+        return {"error": "unknown command"}
+    def get_stats(self):
+        """
+        SERVER method:
+            returns the server metrics as a dict
+        """
+        return {
+            "games": len(self.sessions),
+            "workers": self.workers,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "searching": self.searching,
+            "completed": self.completed,
+            "nodes": self.nodes,
+            "wait_ms": summarize(self.waits),
+            "latency_ms": summarize(self.latencies),
+        }
+
+    # Helper methods
+    async def __handle_client(self, reader, writer):
+        """
+        HELPER METHOD:
+            answers one connection's requests in order, closes its games when it disconnects
+        """
+        owned = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = await self.handle_request(json.loads(line), owned)
+                except Exception as error:         # Bad request or failed job, the connection stays up
+                    response = {"error": "%s: %s" % (type(error).__name__, error)}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for game_id in owned:
+                self.sessions.pop(game_id, None)
+            writer.close()
+    async def __run(self, session, move, search):
+        """
+        HELPER METHOD:
+            queues a job for the session (waiting while the queue is full) that plays "move"
+            (if not None) and then searches (if "search"), makes the moves the worker played,
+            returns the response
+        """
+        session.busy = True
+        try:
+            future = asyncio.get_running_loop().create_future()
+            await self.queue.put((session, move, search, future, time.perf_counter()))
+            self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+            result = await future
+        finally:
+            session.busy = False
+        if "error" in result:
+            return result
+        response = {}
+        for squares in (result["played"], result["reply"]):
+            if squares is not None:
+                session.gs.make_move(Engine.Move(squares[0], squares[1], session.gs.board))
+                session.gs.switch_turn()
+        if result["reply"] is not None:
+            response = {"reply": format_squares(result["reply"]), "score": result["score"], "nodes": result["nodes"]}
+        session.status = result["status"]
+        session.moves = result["moves"]
+        response.update(self.__describe(session))
+        return response
+    async def __dispatch(self):
+        """
+        HELPER METHOD:
+            worker loop, hands queued jobs to the process pool one at a time
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            session, move, search, future, queued = await self.queue.get()
+            self.waits.append(time.perf_counter() - queued)
+            self.searching += 1
+            try:
+                result = await loop.run_in_executor(self.pool, play, session.gs.get_fen(), move, session.depth, search)
+                self.nodes += result.get("nodes", 0)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as error:
+                if not future.done():
+                    future.set_exception(error)
+            finally:
+                self.searching -= 1
+                self.completed += 1
+                self.latencies.append(time.perf_counter() - queued)
+    def __describe(self, session):
+        """
+        HELPER METHOD:
+            returns the session's position, status and valid moves as a dict
+        """
+        return {
+            "game": session.game_id,
+            "fen": session.gs.get_fen(),
+            "status": session.status,
+            "moves": session.moves,
+        }
+
+# Runs in the worker processes, each keeps one AIPlayer (and its tables) between searches
+WORKER_AI = None
+def play(fen, move, depth, search):
+    """
+    HELPER METHOD:
+        worker job: in the FEN position, plays "move" (ex. "e2e4", if not None) and then
+        the engine's best move (if "search" and the game isn't over), returns a dict of:
+            "played", "reply": (start, end) squares of the moves made, or None
+            "score", "nodes": the engine search's results
+            "status", "moves": the status and valid moves ("e2e4", ...) afterwards
+        or {"error": ...} if "move" isn't valid.
+    """
+    global WORKER_AI
+    gs = Engine.Gamestate()
+    gs.load_fen(fen)
+    result = {"played": None, "reply": None, "score": 0, "nodes": 0}
+    if move is not None:
+        valid = parse_move(gs, move)
+        if valid is None:
+            return {"error": "invalid move"}
+        gs.make_move(valid)
+        gs.switch_turn()
+        result["played"] = (valid.start, valid.end)
+    if search and get_status(gs) == "playing":
+        if WORKER_AI is None:
+            WORKER_AI = Player.AIPlayer('w')
+        WORKER_AI.color = gs.current_player
+        WORKER_AI.DEPTH = depth
+        reply = WORKER_AI.get_move(gs)
+        result["score"] = WORKER_AI.score
+        result["nodes"] = WORKER_AI.nodes
+        if reply is not None:
+            gs.make_move(reply)
+            gs.switch_turn()
+            result["reply"] = (reply.start, reply.end)
+    moves = gs.gen_valid_moves()
+    result["moves"] = [format_squares((valid.start, valid.end)) for valid in moves]
+    result["status"] = "playing" if len(moves) != 0 else "checkmate" if gs.is_check() else "stalemate"
+    return result
+
+def format_squares(squares):
+    """
+    HELPER METHOD:
+        returns (start, end) squares written as "e2e4"
+    """
+    return "".join(chr(97 + pos[1]) + str(8 - pos[0]) for pos in squares)
+def parse_move(gs, text):
+    """
+    HELPER METHOD:
+        returns the valid move of gs written as "text" (ex. "e2e4"), or None
+    """
+    if len(text) < 4:
+        return None
+    start = (8 - int(text[1]), ord(text[0]) - 97) if text[1].isdigit() else (-1, -1)
+    end = (8 - int(text[3]), ord(text[2]) - 97) if text[3].isdigit() else (-1, -1)
+    if not (Engine.is_valid_pos(start) and Engine.is_valid_pos(end)):
+        return None
+    move = Engine.Move(start, end, gs.board)
+    if move in gs.gen_valid_moves():
+        return move
+    return None
+def get_status(gs):
+    """
+    HELPER METHOD:
+        returns "checkmate", "stalemate" or "playing"
+    """
+    if gs.is_checkmate():
+        return "checkmate"
+    if gs.is_stalemate():
+        return "stalemate"
+    return "playing"
+def summarize(seconds):
+    """
+    HELPER METHOD:
+        returns the p50/p95/max of a list of durations, in milliseconds
+    """
+    if len(seconds) == 0:
+        return {"p50": 0, "p95": 0, "max": 0}
+    ordered = sorted(seconds)
+    return {
+        "p50": round(1000 * ordered[len(ordered) // 2], 1),
+        "p95": round(1000 * ordered[min(len(ordered) - 1, len(ordered) * 95 // 100)], 1),
+        "max": round(1000 * ordered[-1], 1),
+    }
+
+if __name__ == "__main__":
+    # Usage: python3 Server.py [port] [workers]
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else PORT
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else WORKERS
+    try:
+        asyncio.run(Server(workers).serve(HOST, port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,272 @@
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import Player
+import Positions
+
+BASELINE_PATH = "benchmark_baseline.json"
+RESULTS_PATH = "benchmark_results.json"
+THRESHOLD = 10              # Percent a summary metric may get worse than the baseline before the run fails
+REFERENCE_TOLERANCE = 50    # Percent the reference workload may differ from the baseline run before comparing is refused
+MIN_TIME = 0.1              # Seconds each throughput measurement runs for, at least
+REFERENCE_TIME = 0.05       # Seconds each reference measurement runs for, at least
+REPEATS = 5                 # Rounds of measurements, the median of each is kept
+SEARCH_DEPTH = 2
+
+# Throughput workloads, as (name, function of a Gamestate)
+WORKLOADS = [
+    ("gen_valid_moves",         lambda gs: gs.gen_valid_moves()),
+    ("is_check",                lambda gs: gs.is_check()),
+    ("evaluate_pieces",         Player.evaluate_pieces),
+    ("evaluate_positioning",    Player.evaluate_positioning),
+]
+
+# Directions scanned by the reference workload
+REFERENCE_DIRECTIONS = ((1,0),(-1,0),(0,1),(0,-1),(1,1),(-1,-1),(1,-1),(-1,1))
+
+class ReferenceMove():
+    """
+    REFERENCEMOVE CLASS:
+        pod class made by the reference workload, like a "Move" but never changed with it
+    """
+
+    def __init__(self, start, end, piece):
+        self.start = start
+        self.end = end
+        self.piece = piece
+
+def reference(gs):
+    """
+    HELPER METHOD:
+        frozen engine-like workload: scans gs.board for the side to move's pieces and
+        walks every ray from them, making a ReferenceMove per reachable square (board
+        indexing, tuples, string compares and small objects, like move generation).
+        it is measured right before and after every engine measurement, and the engine
+        results are kept as ratios to it, so the machine speeding up or slowing down
+        during or between runs cancels out. engine changes must not touch it.
+    """
+    board = gs.board
+    player = gs.current_player
+    moves = []
+    for row in range(8):
+        for col in range(8):
+            if board[row][col][0] == player:
+                for d_r, d_c in REFERENCE_DIRECTIONS:
+                    for dist in range(1, 8):
+                        row2, col2 = row + dist * d_r, col + dist * d_c
+                        if not (0 <= row2 < 8 and 0 <= col2 < 8):
+                            break
+                        color = board[row2][col2][0]
+                        if color != player:
+                            moves.append(ReferenceMove((row, col), (row2, col2), board[row2][col2]))
+                        if color != ' ':
+                            break
+    return moves
+
+def measure_rate(function, gs, min_time=MIN_TIME):
+    """
+    HELPER METHOD:
+        returns the calls per second of function(gs), measured for at least min_time seconds
+    """
+    calls = 0
+    batch = 1
+    start = time.perf_counter()
+    elapsed = 0
+    while elapsed < min_time:
+        for _ in range(batch):
+            function(gs)
+        calls += batch
+        batch *= 2
+        elapsed = time.perf_counter() - start
+    return calls / elapsed
+def measure_search(gs, depth):
+    """
+    HELPER METHOD:
+        returns (seconds, nodes) of a fresh AIPlayer searching gs to "depth"
+    """
+    ai = Player.AIPlayer(gs.current_player)
+    ai.DEPTH = depth
+    start = time.perf_counter()
+    ai.get_move(gs)
+    return time.perf_counter() - start, ai.nodes
+
+def get_host():
+    """
+    HELPER METHOD:
+        returns a dict describing the machine and python running the benchmark
+    """
+    return {
+        "node": platform.node(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "python": "%s %s" % (platform.python_implementation(), platform.python_version()),
+    }
+def run(depth=SEARCH_DEPTH):
+    """
+    HELPER METHOD:
+        runs every workload on every suite position, returns the results as a dict:
+            "metrics": name -> {"value", "raw", "unit", "higher_is_better"}, one per workload and position
+            "summary": the same, one per workload (geometric mean over the positions)
+            "nodes": position -> nodes searched (the search should be deterministic)
+            "reference": median calls/s of the reference workload
+            "host": get_host()
+
+        "raw" is the measured value, "value" is the same measurement relative to the
+        reference workload measured around it: calls per reference call for throughput,
+        seconds times reference calls/s for search time. only "value" is compared.
+
+        everything is measured once per round, for REPEATS rounds, and the median round
+        is kept. the garbage collector is off while measuring (like timeit).
+    """
+    positions = Positions.all_positions()
+    references = []
+    ratios = {}
+    raws = {}
+    nodes = {}
+
+    def measure(key, function, gs):
+        # Engine measurement between two reference measurements
+        before = references[-1]
+        raw = function(gs)
+        references.append(measure_rate(reference, gs, REFERENCE_TIME))
+        speed = (before + references[-1]) / 2
+        raws.setdefault(key, []).append(raw)
+        return raw, speed
+
+    gc.collect()
+    gc.disable()
+    try:
+        references.append(measure_rate(reference, positions[0][1], REFERENCE_TIME))
+        for _ in range(REPEATS):
+            for position, gs in positions:
+                for name, function in WORKLOADS:
+                    key = "%s/%s" % (name, position)
+                    raw, speed = measure(key, lambda gs: measure_rate(function, gs), gs)
+                    ratios.setdefault(key, []).append(raw / speed)
+                key = "search/%s/seconds" % position
+                (seconds, nodes[position]), speed = measure(key, lambda gs: measure_search(gs, depth), gs)
+                ratios.setdefault(key, []).append(seconds * speed)
+                gc.collect()
+    finally:
+        gc.enable()
+
+    metrics = {}
+    summary = {}
+    for name, _ in WORKLOADS:
+        for position, _ in positions:
+            key = "%s/%s" % (name, position)
+            metrics[key] = {"value": statistics.median(ratios[key]), "raw": statistics.median(raws[key]), "unit": "calls/s", "higher_is_better": True}
+        values = [metrics["%s/%s" % (name, position)] for position, _ in positions]
+        summary[name] = {
+            "value": geometric_mean([metric["value"] for metric in values]),
+            "raw": geometric_mean([metric["raw"] for metric in values]),
+            "unit": "calls/s", "higher_is_better": True,
+        }
+    for position, _ in positions:
+        key = "search/%s/seconds" % position
+        seconds = statistics.median(raw[0] for raw in raws[key])
+        metrics[key] = {"value": statistics.median(ratios[key]), "raw": seconds, "unit": "s", "higher_is_better": False}
+        metrics["search/%s/nps" % position] = {"value": nodes[position] / metrics[key]["value"], "raw": nodes[position] / seconds, "unit": "nodes/s", "higher_is_better": True}
+    searches = [metrics["search/%s/seconds" % position] for position, _ in positions]
+    summary["search/seconds"] = {"value": sum(metric["value"] for metric in searches), "raw": sum(metric["raw"] for metric in searches), "unit": "s", "higher_is_better": False}
+    summary["search/nps"] = {
+        "value": sum(nodes.values()) / summary["search/seconds"]["value"],
+        "raw": sum(nodes.values()) / summary["search/seconds"]["raw"],
+        "unit": "nodes/s", "higher_is_better": True,
+    }
+    return {
+        "host": get_host(),
+        "depth": depth,
+        "reference": statistics.median(references),
+        "summary": summary,
+        "metrics": metrics,
+        "nodes": nodes,
+    }
+def check_comparable(results, baseline):
+    """
+    HELPER METHOD:
+        returns why results can't be compared with the baseline, or None if they can
+    """
+    if baseline.get("host") != results["host"]:
+        return "baseline was saved on %s, this is %s" % (baseline.get("host"), results["host"])
+    if baseline["depth"] != results["depth"]:
+        return "baseline was searched to depth %d, not %d" % (baseline["depth"], results["depth"])
+    change = 100 * abs(results["reference"] - baseline["reference"]) / baseline["reference"]
+    if change > REFERENCE_TOLERANCE:
+        return "the reference workload ran %.0f%% %s than when the baseline was saved" % (change, "faster" if results["reference"] > baseline["reference"] else "slower")
+    return None
+def compare(results, baseline, section, threshold=THRESHOLD):
+    """
+    HELPER METHOD:
+        returns a list of (metric, baseline value, value, change in percent, regressed)
+        for every metric of results[section] that is also in the baseline.
+        change is positive when the metric got better, regressed is true when it is worse
+        than -threshold percent.
+    """
+    rows = []
+    for name, metric in results[section].items():
+        if name not in baseline[section]:
+            continue
+        old = baseline[section][name]["value"]
+        new = metric["value"]
+        change = 100 * (new - old) / old if metric["higher_is_better"] else 100 * (old - new) / old
+        rows.append((name, old, new, change, change < -threshold))
+    return rows
+def geometric_mean(values):
+    """
+    HELPER METHOD:
+        returns the geometric mean of a list of positive numbers
+    """
+    product = 1
+    for value in values:
+        product *= value
+    return product ** (1 / len(values))
+
+def main():
+    # Usage: python3 benchmark.py [baseline file] [--save] [--threshold=<percent>] [--depth=<depth>]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    options = dict(arg[2:].partition("=")[::2] for arg in sys.argv[1:] if arg.startswith("--"))
+    baseline_path = args[0] if len(args) > 0 else BASELINE_PATH
+    threshold = float(options.get("threshold", THRESHOLD))
+
+    results = run(int(options.get("depth", SEARCH_DEPTH)))
+    with open(RESULTS_PATH, "w") as out:
+        json.dump(results, out, indent=2, sort_keys=True)
+    if "save" in options:
+        with open(baseline_path, "w") as out:
+            json.dump(results, out, indent=2, sort_keys=True)
+        print("Saved baseline to %s" % baseline_path)
+        return 0
+    if not os.path.exists(baseline_path):
+        for name, metric in list(results["summary"].items()) + list(results["metrics"].items()):
+            print("%-36s %14.6g %s" % (name, metric["raw"], metric["unit"]))
+        print("No baseline at %s (run with --save to make one on this machine)" % baseline_path)
+        return 0
+
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    problem = check_comparable(results, baseline)
+    if problem is not None:
+        print("Not comparing: %s (run with --save to make a new baseline)" % problem)
+        return 2
+    print("Values are relative to the reference workload (reference %.2fx the baseline run)" % (results["reference"] / baseline["reference"]))
+    print("%-36s %14s %14s %8s" % ("metric", "baseline", "now", "change"))
+    # Only the summary decides the result, single positions are too noisy and are shown for information
+    summary = compare(results, baseline, "summary", threshold)
+    for name, old, new, change, regressed in summary + [row[:4] + (False,) for row in compare(results, baseline, "metrics")]:
+        print("%-36s %14.6g %14.6g %+7.1f%% %s" % (name, old, new, change, "REGRESSED" if regressed else ""))
+    for position, nodes in results["nodes"].items():
+        if baseline["nodes"].get(position, nodes) != nodes:
+            print("search/%s searched %d nodes, baseline %d (search changed)" % (position, nodes, baseline["nodes"][position]))
+
+    regressions = sum(1 for row in summary if row[4])
+    print("%d of %d summary metrics regressed by more than %g%%" % (regressions, len(summary), threshold))
+    return 1 if regressions != 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
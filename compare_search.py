@@ -0,0 +1,43 @@
+import sys
+import time
+
+import Player
+import Positions
+
+# Search feature sets to compare, as (name, AIPlayer options)
+CONFIGS = [
+    ("plain",       {"NULL_MOVE": False, "LMR": False, "PVS": False, "ASPIRATION": False}),
+    ("null-move",   {"NULL_MOVE": True,  "LMR": False, "PVS": False, "ASPIRATION": False}),
+    ("lmr",         {"NULL_MOVE": False, "LMR": True,  "PVS": False, "ASPIRATION": False}),
+    ("null+lmr",    {"NULL_MOVE": True,  "LMR": True,  "PVS": False, "ASPIRATION": False}),
+    ("pvs",         {"NULL_MOVE": False, "LMR": False, "PVS": True,  "ASPIRATION": False}),
+    ("pvs+asp",     {"NULL_MOVE": False, "LMR": False, "PVS": True,  "ASPIRATION": True}),
+    ("all",         {"NULL_MOVE": True,  "LMR": True,  "PVS": True,  "ASPIRATION": True}),
+]
+
+def main():
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    print("%-12s %-10s %10s %6s %6s %6s %6s %8s %7s  %s" % ("position", "search", "nodes", "re", "asp", "eval%", "pawn%", "time", "score", "pv"))
+    totals = {name: 0 for name, _ in CONFIGS}
+    for position, gs in Positions.all_positions():
+        for name, options in CONFIGS:
+            ai = Player.AIPlayer(gs.current_player)
+            ai.DEPTH = depth
+            for option, value in options.items():
+                setattr(ai, option, value)
+
+            start = time.perf_counter()
+            ai.get_move(gs)
+            elapsed = time.perf_counter() - start
+
+            totals[name] += ai.nodes
+            pv = " ".join(str(move.move_id) for move in ai.pv)
+            eval_hits = 100 * ai.eval_cache.hit_rate() if ai.eval_cache is not None else 0
+            pawn_hits = 100 * ai.pawn_table.hit_rate() if ai.pawn_table is not None else 0
+            print("%-12s %-10s %10d %6d %6d %6.1f %6.1f %7.2fs %7d  %s" % (position, name, ai.nodes, ai.researches, ai.aspiration_fails, eval_hits, pawn_hits, elapsed, ai.score, pv))
+    print()
+    for name, _ in CONFIGS:
+        print("%-23s %10d" % (name, totals[name]))
+
+if __name__ == "__main__":
+    main()
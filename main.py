@@ -1,17 +1,33 @@
+import copy
+import threading
+
 import pygame as p
 
 import Engine
+import GameLog
 import Gui
 import Player
 
+# Posted by the search thread when an engine player has picked a move
+ENGINE_MOVE = p.USEREVENT + 1
+
+# Finished games are appended here (GAME_LOG_PATH.moves / GAME_LOG_PATH.index)
+GAME_LOG_PATH = "games"
+
+# Only these events can wake the loop up while it is idle
+WAKE_EVENTS = [p.QUIT, p.MOUSEBUTTONDOWN, p.KEYDOWN, p.VIDEOEXPOSE, ENGINE_MOVE]
+
 def main():
     # Initialize pygame and resources
     p.init()
     clock = p.time.Clock()
+    p.event.set_blocked(None)
+    p.event.set_allowed(WAKE_EVENTS)
 
     # Initialize the Game, GUI, Animations, etc.
     gui = Gui.Gui()
     gs = Engine.Gamestate()
+    game_log = GameLog.GameLog(GAME_LOG_PATH)
 
     # Initialize Players
     player1 = Player.HumanPlayer('w')
@@ -19,53 +35,131 @@ def main():
 
     # Start board displaying
     gui.update_screen(gs)
+    p.display.flip()
 
     # Game Loop
     running = True
+    idle = False        # Nothing animating or waiting to be checked -> sleep until an event
+    search_id = 0       # Bumped on reset, results from older searches are thrown away
+    searching = False   # An engine search is running in the background
+    search = None       # (player, thread) of the last search started
+    game_over = False   # The engine found no moves, don't search this position again
     while running:
-        for g_e in p.event.get():
+        if idle:
+            events = [p.event.wait()] + p.event.get()
+        else:
+            events = p.event.get()
+
+        for g_e in events:
             if g_e.type == p.QUIT:                  # Event: Quit
+                log_game(game_log, gs)
                 running = False
             elif g_e.type == p.MOUSEBUTTONDOWN:     # Event: Mouse pressed
                 gui.store_click(gs)
-                gui.update_screen(gs)
+            elif g_e.type == ENGINE_MOVE:           # Event: Engine finished searching
+                if g_e.search_id == search_id:
+                    searching = False
+                    game_over = g_e.move is None
+                    if g_e.move is not None:
+                        gui.store_animation(g_e.move)
+                        gs.make_move(g_e.move)
+                        gs.switch_turn()
             elif g_e.type == p.KEYDOWN:             # Event: Key pressed
                 if g_e.key == p.K_r:                    # Key: r (reset)
+                    log_game(game_log, gs)                  # Save the game
                     gs.reset_game()                              # Reset the game
                     gui.clear_animations()                  # Clear animations
                     gui.clear_clicks()                      # Clear clicks
-                    gui.update_screen(gs)                   # Re-draw
+                    stop_search(search)                     # Drop any running search
+                    search_id += 1
+                    searching = False
+                    game_over = False
                 elif g_e.key == p.K_c:                  # Key: c (change color)
                     oldp1color = player1.color              # Switch the colors
                     player1.color = player2.color
                     player2.color = oldp1color
                     gui.white_view = not gui.white_view     # Switch the view
-                    
+
+                    log_game(game_log, gs)                  # Save the game
                     gs.reset_game()                         # Reset the game
                     gui.clear_animations()                  # Clear animations
                     gui.clear_clicks()                      # Clear clicks
-                    gui.update_screen(gs)                   # Re-draw
+                    stop_search(search)                     # Drop any running search
+                    search_id += 1
+                    searching = False
+                    game_over = False
 
         if len(gui.animations) == 0:                # Animating = False
-            move = player1.get_move(gs) if gs.current_player == player1.get_color() else player2.get_move(gs)
-            if move is not None:                        # If a move can be made
-                gui.store_animation(move)
-                gs.make_move(move)
-                gs.switch_turn()
-
-            if len(gui.clicks) == 2:                    # If a click-move is ready
-                if gs.current_player == player1.color and isinstance(player1, Player.HumanPlayer):
-                    player1.move_prepared = gui.clicks
-                elif gs.current_player == player2.color and isinstance(player2, Player.HumanPlayer):
-                    player2.move_prepared = gui.clicks
-                gui.clear_clicks()
-                gui.update_screen(gs)
-        else:                                       # Animating = True
+            player = player1 if gs.current_player == player1.get_color() else player2
+            if isinstance(player, Player.HumanPlayer):
+                if len(gui.clicks) == 2:                # If a click-move is ready
+                    player.move_prepared = gui.clicks
+                    gui.clear_clicks()
+                move = player.get_move(gs)
+                if move is not None:                    # If a move can be made
+                    player.move_prepared = ((-1,-1),(-1,-1))
+                    gui.store_animation(move)
+                    gs.make_move(move)
+                    gs.switch_turn()
+            else:
+                if len(gui.clicks) == 2:                # Not the human's turn, drop the click-move
+                    gui.clear_clicks()
+                if not searching and not game_over:     # Search off the main thread
+                    searching = True
+                    search = start_search(player, gs, search_id)
+
+        idle = len(gui.animations) == 0
+        if not idle:                                # Animating = True
             gui.update_animations()
-            gui.update_screen(gs)
+            clock.tick(Gui.MAX_FPS)
 
-        clock.tick(Gui.MAX_FPS)
+        gui.update_screen(gs)
         p.display.flip()
+    game_log.close()
+
+def log_game(game_log, gs):
+    """
+    HELPER METHOD:
+        appends the moves played so far to the game log (if there are any),
+        with the result if the game is over.
+    """
+    if len(gs.past_moves) == 0:
+        return
+    result = "*"
+    if gs.is_checkmate():
+        result = "0-1" if gs.current_player == 'w' else "1-0"
+    elif gs.is_stalemate():
+        result = "1/2-1/2"
+    game_log.append_game(gs.past_moves, result)
+
+def start_search(player, gs, search_id):
+    """
+    HELPER METHOD:
+        runs player.get_move on a copy of the gamestate in a background thread,
+        returns (player, thread) for stop_search.
+        the result is posted back to the game loop as an ENGINE_MOVE event,
+        tagged with search_id so that stale results can be ignored.
+    """
+    search_gs = copy.deepcopy(gs)
+    def search():
+        move = player.get_move(search_gs)
+        p.event.post(p.event.Event(ENGINE_MOVE, move=move, search_id=search_id))
+    thread = threading.Thread(target=search, daemon=True)
+    player.stopped = False
+    thread.start()
+    return player, thread
+
+def stop_search(search):
+    """
+    HELPER METHOD:
+        stops a search started by start_search (if any) and waits for its thread to end,
+        so the player's search state (pv, killers, tables) is never used by two searches at once.
+    """
+    if search is None:
+        return
+    player, thread = search
+    player.stopped = True
+    thread.join()
 
 if __name__ == "__main__":
     main()